@@ -0,0 +1,18 @@
+import os
+import diskcache
+
+# APIレスポンスのディスクキャッシュ（セッションをまたいで同じキーワードの再取得を避ける）
+CACHE_DIR = os.getenv("NICHE_CACHE_DIR", ".niche_cache")
+
+# キャッシュの有効期限（秒）
+TRENDS_TTL = 60 * 60 * 24          # Google Trends: 24時間
+COMPETITION_TTL = 60 * 60 * 24     # Semrush/Ubersuggest: 24時間
+VOLUME_TTL = 60 * 60 * 24 * 7      # 検索ボリューム: 7日間
+TWITTER_TTL = 60 * 60 * 24         # Twitter/X検索結果: 24時間
+REVALIDATE_TTL = 60 * 60 * 24 * 30 # 条件付きリクエスト用のETag/ハッシュ値: 30日間
+
+cache = diskcache.Cache(CACHE_DIR)
+
+def clear_cache():
+    """キャッシュされたAPIレスポンスをすべて削除する"""
+    cache.clear()
@@ -1,9 +1,24 @@
-import requests
+import asyncio
+import hashlib
+import httpx
+import numpy as np
 import json
-import time
 import os
+import re
 from dotenv import load_dotenv
 
+from api_cache import cache, COMPETITION_TTL, REVALIDATE_TTL
+
+# APIリクエストの同時実行数（1秒あたりのリクエスト数の上限を兼ねる）
+MAX_REQUESTS_PER_SECOND = 5
+
+# Semrush phrase_theseで1リクエストにまとめられるキーワード数の上限
+SEMRUSH_BATCH_SIZE = 100
+
+# 競合が激しいと仮定する一般的な日本語キーワード（全語を1回の走査で検出する。重なった出現も拾うよう先読みを使用）
+COMMON_KEYWORDS = ["方法", "やり方", "おすすめ", "ランキング", "比較"]
+_COMMON_KEYWORDS_PATTERN = re.compile("(?=(" + "|".join(map(re.escape, COMMON_KEYWORDS)) + "))")
+
 def analyze_competition(keywords, semrush_api_key=None, ubersuggest_api_key=None):
     """
     SemrushまたはUbersuggestのAPIを使用してキーワードの競合分析を行う
@@ -16,94 +31,228 @@ def analyze_competition(keywords, semrush_api_key=None, ubersuggest_api_key=None
     Returns:
     dict: キーワードごとの競合分析結果
     """
-    results = {}
+    # どちらのAPIも利用できない場合はモックデータを使用（通信が不要なので同期処理で十分）
+    if not semrush_api_key and not ubersuggest_api_key:
+        return mock_competition_data_batch(keywords)
+    
+    return asyncio.run(analyze_competition_async(keywords, semrush_api_key, ubersuggest_api_key))
+
+async def analyze_competition_async(keywords, semrush_api_key=None, ubersuggest_api_key=None):
+    """
+    analyze_competitionの非同期版。APIリクエストをまとめて、または並行して実行する
+    
+    Parameters:
+    keywords (list): 分析するキーワードのリスト
+    semrush_api_key (str): Semrush API Key（オプション）
+    ubersuggest_api_key (str): Ubersuggest API Key（オプション）
+    
+    Returns:
+    dict: キーワードごとの競合分析結果
+    """
+    # Semrush APIが提供されている場合はそれを使用し、なければUbersuggest APIを使用
+    if semrush_api_key:
+        source = "Semrush"
+    elif ubersuggest_api_key:
+        source = "Ubersuggest"
+    else:
+        return mock_competition_data_batch(keywords)
     
+    # キャッシュにあるキーワードはAPIを呼ばない（キャッシュキーにはAPIキーを含めない）
+    fetched = {}
+    missing = []
     for keyword in keywords:
-        try:
-            # Semrush APIが提供されている場合はそれを使用
+        cached = cache.get((source, keyword))
+        if cached is not None:
+            fetched[keyword] = cached
+        else:
+            missing.append(keyword)
+    
+    if missing:
+        # APIレート制限を考慮（取得した枠は1秒後に返却され、1秒あたりのリクエスト数を制限する）
+        semaphore = asyncio.Semaphore(MAX_REQUESTS_PER_SECOND)
+        
+        async def sem_bounded(fetch, *args):
+            await semaphore.acquire()
+            asyncio.get_running_loop().call_later(1, semaphore.release)
+            return await fetch(*args)
+        
+        async with httpx.AsyncClient(timeout=10, limits=httpx.Limits(max_connections=8)) as client:
             if semrush_api_key:
-                data = get_semrush_data(keyword, semrush_api_key)
-                results[keyword] = {
-                    "キーワード難易度": data.get("難易度", 0),
-                    "競合サイト数": data.get("競合サイト数", 0),
-                    "データソース": "Semrush"
-                }
-            
-            # Ubersuggest APIが提供されている場合はそれを使用
-            elif ubersuggest_api_key:
-                data = get_ubersuggest_data(keyword, ubersuggest_api_key)
-                results[keyword] = {
-                    "キーワード難易度": data.get("難易度", 0),
-                    "競合サイト数": data.get("競合サイト数", 0),
-                    "データソース": "Ubersuggest"
-                }
-            
-            # どちらのAPIも利用できない場合はモックデータを使用
+                # Semrushはphrase_theseで複数キーワードを1リクエストにまとめて取得
+                batches = [missing[i:i+SEMRUSH_BATCH_SIZE] for i in range(0, len(missing), SEMRUSH_BATCH_SIZE)]
+                tasks = [sem_bounded(_fetch_semrush_batch, client, batch, semrush_api_key) for batch in batches]
+                for data in await asyncio.gather(*tasks, return_exceptions=True):
+                    if isinstance(data, Exception):
+                        print(f"競合分析エラー (Semrush): {data}")
+                        continue
+                    fetched.update(data)
             else:
-                results[keyword] = mock_competition_data(keyword)
-            
-            # APIレート制限を考慮
-            time.sleep(1)
-            
-        except Exception as e:
-            print(f"競合分析エラー ({keyword}): {e}")
-            results[keyword] = mock_competition_data(keyword)
+                tasks = [sem_bounded(_fetch_ubersuggest, client, keyword, ubersuggest_api_key) for keyword in missing]
+                for keyword, data in zip(missing, await asyncio.gather(*tasks, return_exceptions=True)):
+                    if isinstance(data, Exception):
+                        print(f"競合分析エラー ({keyword}): {data}")
+                        continue
+                    fetched[keyword] = data
+        
+        for keyword in missing:
+            if keyword in fetched:
+                cache.set((source, keyword), fetched[keyword], expire=COMPETITION_TTL)
+    
+    # APIからデータを取得できなかったキーワードはモックデータを使用
+    mock_data = mock_competition_data_batch([keyword for keyword in keywords if keyword not in fetched])
+    
+    results = {}
+    for keyword in keywords:
+        if keyword in mock_data:
+            results[keyword] = mock_data[keyword]
+            continue
+        
+        data = fetched[keyword]
+        results[keyword] = {
+            "キーワード難易度": data.get("難易度", 0),
+            "競合サイト数": data.get("競合サイト数", 0),
+            "データソース": source
+        }
     
     return results
 
-def get_semrush_data(keyword, api_key):
+async def _fetch_semrush_batch(client, keywords, api_key):
     """
-    Semrush APIからキーワードデータを取得
-    （注: 実際の実装ではSemrushの公式APIドキュメントに従って実装する必要があります）
+    Semrush APIのphrase_theseで複数キーワードのデータをまとめて取得
+    
+    Parameters:
+    client (httpx.AsyncClient): HTTPクライアント
+    keywords (list): キーワードのリスト（最大100個）
+    api_key (str): Semrush API Key
+    
+    Returns:
+    dict: キーワードごとの難易度と競合サイト数（データがないキーワードは含まれない）
     """
-    # 実際のSemrush API実装はこちら
-    # endpoint = f"https://api.semrush.com/?type=phrase_this&key={api_key}&phrase={keyword}&database=jp&export_columns=Kd,Cp,Co"
-    # response = requests.get(endpoint)
-    # ここでレスポンスをパースする
+    params = {
+        "type": "phrase_these",
+        "key": api_key,
+        "phrase": ";".join(keywords),
+        "database": "jp",
+        "export_columns": "Ph,Kd,Nr"  # キーワード、キーワード難易度、検索結果のURL数
+    }
+    # キャッシュキーにはAPIキーを含めない
+    cache_key = ("Semrush:response", tuple(keywords))
+    rows = await _conditional_get(client, "https://api.semrush.com/", params, cache_key, _parse_semrush_csv)
     
-    # モックデータを返す（実際の実装では削除）
-    return mock_competition_data(keyword)
+    # Semrushはキーワードを小文字に正規化して返すため、元のキーワードに対応付ける
+    result = {}
+    for keyword in keywords:
+        row = rows.get(keyword, rows.get(keyword.lower()))
+        if row is not None:
+            result[keyword] = row
+    return result
 
-def get_ubersuggest_data(keyword, api_key):
+async def _conditional_get(client, url, params, cache_key, parse):
+    """
+    前回のレスポンスのETagまたは本文のハッシュ値を使って、変更がなければ前回のパース結果を再利用する
+    
+    Parameters:
+    client (httpx.AsyncClient): HTTPクライアント
+    url (str): リクエスト先のURL
+    params (dict): クエリパラメータ
+    cache_key (tuple): ETag・ハッシュ値・パース結果を保存するキャッシュキー
+    parse (callable): レスポンス本文をパースする関数
+    
+    Returns:
+    パース結果
+    """
+    entry = cache.get(cache_key)
+    headers = {"If-None-Match": entry["etag"]} if entry and entry["etag"] else {}
+    
+    response = await client.get(url, params=params, headers=headers)
+    
+    # 304 Not Modifiedの場合は前回のパース結果を再利用し、有効期限だけ延長する
+    if response.status_code == 304 and entry:
+        cache.set(cache_key, entry, expire=REVALIDATE_TTL)
+        return entry["body"]
+    
+    response.raise_for_status()
+    
+    # ETagに対応していないAPIでは、本文のハッシュ値が前回と同じならパースを省略する
+    digest = hashlib.blake2b(response.content, digest_size=16).hexdigest()
+    if entry and entry["digest"] == digest:
+        body = entry["body"]
+    else:
+        body = parse(response.text)
+    
+    cache.set(cache_key, {"etag": response.headers.get("ETag"), "digest": digest, "body": body}, expire=REVALIDATE_TTL)
+    return body
+
+def _parse_semrush_csv(text):
+    """
+    Semrush APIのCSVレスポンス（セミコロン区切り、1行目はヘッダー）をパースする
+    
+    Returns:
+    dict: キーワードごとの難易度と競合サイト数
+    """
+    # エラー時は "ERROR 50 :: NOTHING FOUND" のような本文が返される
+    if text.startswith("ERROR"):
+        raise ValueError(text.strip())
+    
+    rows = {}
+    for line in text.strip().splitlines()[1:]:
+        columns = line.split(";")
+        if len(columns) < 3:
+            continue
+        phrase, difficulty, results_count = columns[:3]
+        rows[phrase] = {
+            "難易度": float(difficulty or 0),
+            "競合サイト数": int(results_count or 0)
+        }
+    return rows
+
+async def _fetch_ubersuggest(client, keyword, api_key):
     """
     Ubersuggest APIからキーワードデータを取得
     （注: 実際の実装ではUbersuggestの公式APIドキュメントに従って実装する必要があります）
     """
     # 実際のUbersuggest API実装はこちら
-    # endpoint = f"https://api.ubersuggest.com/keyword_data?api_key={api_key}&keyword={keyword}&country=jp"
-    # response = requests.get(endpoint)
-    # ここでレスポンスをパースする
+    # params = {"api_key": api_key, "keyword": keyword, "country": "jp"}
+    # cache_key = ("Ubersuggest:response", keyword)
+    # data = await _conditional_get(client, "https://api.ubersuggest.com/keyword_data", params, cache_key, parse)
+    # parseにはレスポンスをパースする関数を渡す
     
     # モックデータを返す（実際の実装では削除）
     return mock_competition_data(keyword)
 
 def mock_competition_data(keyword):
     """モックデータ生成（APIが利用できない場合のテスト用）"""
-    import random
-    import hashlib
+    return mock_competition_data_batch([keyword])[keyword]
+
+def mock_competition_data_batch(keywords):
+    """複数キーワードのモックデータをまとめて生成（APIが利用できない場合のテスト用）"""
+    if not keywords:
+        return {}
     
-    # キーワードからハッシュ値を生成し、それを整数に変換して一貫性のあるランダム値を生成
-    hash_obj = hashlib.md5(keyword.encode())
-    hash_int = int(hash_obj.hexdigest(), 16)
-    random.seed(hash_int)
+    # キーワードのハッシュ値を0以上1未満の値に変換し、キーワードごとに一貫性のあるランダム値とする
+    # （キーワードごとに2つの値: 基本難易度用と競合サイト数用）
+    digests = b"".join(hashlib.blake2b(keyword.encode(), digest_size=16).digest() for keyword in keywords)
+    random_values = np.frombuffer(digests, dtype="<u8").reshape(-1, 2) / 2.0**64
     
     # キーワードの長さと複雑さに基づいて難易度を調整
-    base_difficulty = random.uniform(0, 100)
-    length_factor = len(keyword) / 10  # 長いキーワードは通常競合が少ない
+    base_difficulty = random_values[:, 0] * 100
+    length_factor = np.array([len(keyword) for keyword in keywords]) / 10  # 長いキーワードは通常競合が少ない
     
-    # 一般的な日本語キーワードは競合が激しいと仮定
-    common_keywords = ["方法", "やり方", "おすすめ", "ランキング", "比較"]
-    common_factor = sum([1 for word in common_keywords if word in keyword]) * 10
+    # 一般的な日本語キーワードは競合が激しいと仮定（含まれる一般的な語の種類数で加算）
+    common_factor = np.array([len(set(_COMMON_KEYWORDS_PATTERN.findall(keyword))) for keyword in keywords]) * 10
     
-    difficulty = min(100, max(0, base_difficulty + common_factor - length_factor))
+    difficulty = np.clip(base_difficulty + common_factor - length_factor, 0, 100)
     
     # 競合サイト数は難易度とある程度相関
-    competitors = int(difficulty * 1000 + random.uniform(0, 10000))
+    competitors = (difficulty * 1000 + random_values[:, 1] * 10000).astype(np.int64)
     
     return {
-        "難易度": round(difficulty, 1),
-        "競合サイト数": competitors,
-        "データソース": "モックデータ"
+        keyword: {
+            "難易度": round(float(keyword_difficulty), 1),
+            "競合サイト数": int(keyword_competitors),
+            "データソース": "モックデータ"
+        }
+        for keyword, keyword_difficulty, keyword_competitors in zip(keywords, difficulty, competitors)
     }
 
 def analyze_genre_competition(genres, semrush_api_key=None, ubersuggest_api_key=None):
@@ -179,7 +328,8 @@ def analyze_genre_competition(genres, semrush_api_key=None, ubersuggest_api_key=
         }
         
         # ジャンル全体の競合スコア計算（平均難易度）
-        avg_difficulty = sum([data.get("キーワード難易度", 0) for data in competition_data.values()]) / len(competition_data) if competition_data else 0
+        difficulties = np.fromiter((data.get("キーワード難易度", 0) for data in competition_data.values()), dtype=np.float64, count=len(competition_data))
+        avg_difficulty = float(difficulties.mean()) if difficulties.size else 0
         
         # 100から引いて、値が高いほど参入しやすい（競合が少ない）ことを示す
         genre_result["競合の少なさスコア"] = 100 - avg_difficulty
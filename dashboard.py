@@ -1,16 +1,81 @@
 import streamlit as st
+import asyncio
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 import os
 import json
+import html
 from dotenv import load_dotenv
 
 # 先に作成した分析モジュールをインポート
-from genre_suggestion import suggest_genres
+from genre_suggestion import suggest_genres, stream_genres
 from demand_analysis import analyze_demand
 from competition_analysis import analyze_genre_competition
 from social_analysis import analyze_genre_social
+from api_cache import clear_cache
+
+# 散布図に描画する点の上限（ブラウザに送るデータ量を抑える）
+MAX_SCATTER_POINTS = 200
+
+def _genres_key(genres):
+    """ジャンル情報をキャッシュキーとして使える正規化済みのJSON文字列に変換する"""
+    return json.dumps(genres, ensure_ascii=False, sort_keys=True)
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def cached_analyze_demand(genres_json, google_api_key):
+    """同じジャンル情報に対する需要分析の結果をキャッシュする"""
+    return analyze_demand(json.loads(genres_json), google_api_key)
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def cached_analyze_genre_competition(genres_json, semrush_api_key=None, ubersuggest_api_key=None):
+    """同じジャンル情報に対する競合分析の結果をキャッシュする"""
+    return analyze_genre_competition(json.loads(genres_json), semrush_api_key, ubersuggest_api_key)
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def cached_analyze_genre_social(genres_json, twitter_bearer_token=None):
+    """同じジャンル情報に対するSNS分析の結果をキャッシュする"""
+    return analyze_genre_social(json.loads(genres_json), twitter_bearer_token)
+
+def _suggest_genres_with_social(anthropic_api_key, num_suggestions, twitter_bearer_token):
+    """
+    Claude APIのジャンル生成とSNS分析を並行して実行する
+    
+    ストリーミングで届いたジャンルから順にTwitter/X分析を開始するため、
+    全体の所要時間は両者の合計ではなく、おおよそ長い方の時間になる
+    （Twitter APIの結果はキーワードごとにディスクキャッシュされるため、cache_dataは使わない）
+    
+    Returns:
+    tuple: (ジャンルのリスト, SNS分析結果)
+    """
+    genres = []
+    
+    def collect(stream):
+        # SNS分析に渡しながら、需要分析・競合分析用にジャンルのリストを集める
+        for genre in stream:
+            genres.append(genre)
+            yield genre
+    
+    social_data = analyze_genre_social(collect(stream_genres(anthropic_api_key, num_suggestions)), twitter_bearer_token)
+    return genres, social_data
+
+async def _run_analyses(genres_json, google_api_key, twitter_bearer_token, add_tweet_analysis):
+    """
+    需要分析・競合分析・SNS分析を並行して実行する
+    
+    各分析は互いに独立しておりI/O待ちが中心のため、それぞれを別スレッドで実行して待ち時間を重ねる
+    
+    Returns:
+    list: [需要分析結果, 競合分析結果]（SNS分析を実行した場合は末尾にSNS分析結果）
+    """
+    tasks = [
+        asyncio.to_thread(cached_analyze_demand, genres_json, google_api_key),
+        asyncio.to_thread(cached_analyze_genre_competition, genres_json),
+    ]
+    if add_tweet_analysis:
+        tasks.append(asyncio.to_thread(cached_analyze_genre_social, genres_json, twitter_bearer_token))
+    
+    return await asyncio.gather(*tasks)
 
 def run_niche_finder():
     """Streamlitダッシュボードを実行するメイン関数"""
@@ -51,6 +116,14 @@ def run_niche_finder():
         
         # 実行ボタン
         start_analysis = st.button("分析開始", type="primary")
+        
+        # APIレスポンスと分析結果のキャッシュ削除
+        if st.button("キャッシュをクリア"):
+            clear_cache()
+            cached_analyze_demand.clear()
+            cached_analyze_genre_competition.clear()
+            cached_analyze_genre_social.clear()
+            st.success("キャッシュをクリアしました")
     
     # メイン画面のタブ
     tab1, tab2, tab3 = st.tabs(["ジャンル候補", "分析結果", "詳細データ"])
@@ -74,23 +147,28 @@ def run_niche_finder():
                 st.error("Anthropic API Keyが設定されていません。")
             else:
                 # Claude APIでジャンル提案を取得
-                st.session_state.genres = suggest_genres(anthropic_api_key, num_suggestions)
+                # （Twitter APIを使う場合は、届いたジャンルから順にSNS分析を並行して進める）
+                stream_social = add_tweet_analysis and bool(twitter_bearer_token)
+                if stream_social:
+                    st.session_state.genres, st.session_state.social_data = _suggest_genres_with_social(
+                        anthropic_api_key, num_suggestions, twitter_bearer_token
+                    )
+                else:
+                    st.session_state.genres = suggest_genres(anthropic_api_key, num_suggestions)
                 
                 if st.session_state.genres:
                     st.success(f"{len(st.session_state.genres)}個のジャンル候補が生成されました！")
                     
-                    # 需要分析
-                    with st.spinner("需要分析を実行中..."):
-                        st.session_state.demand_data = analyze_demand(st.session_state.genres, google_api_key)
+                    genres_json = _genres_key(st.session_state.genres)
                     
-                    # 競合分析
-                    with st.spinner("競合分析を実行中..."):
-                        st.session_state.competition_data = analyze_genre_competition(st.session_state.genres)
+                    # 需要分析・競合分析・SNS分析（オプション、未実行の場合）を並行して実行
+                    run_social = add_tweet_analysis and not stream_social
+                    with st.spinner("需要・競合・SNS分析を実行中..." if run_social else "需要・競合分析を実行中..."):
+                        results = asyncio.run(_run_analyses(genres_json, google_api_key, twitter_bearer_token, run_social))
                     
-                    # SNS分析（オプション）
-                    if add_tweet_analysis:
-                        with st.spinner("Twitter/X分析を実行中..."):
-                            st.session_state.social_data = analyze_genre_social(st.session_state.genres, twitter_bearer_token)
+                    st.session_state.demand_data, st.session_state.competition_data = results[:2]
+                    if run_social:
+                        st.session_state.social_data = results[2]
                     
                     # 総合スコアの計算
                     calculate_final_scores()
@@ -99,239 +177,314 @@ def run_niche_finder():
                 else:
                     st.error("ジャンル候補の生成に失敗しました。API Keyを確認してください。")
     
-    # タブ1の内容: ジャンル候補一覧
+    # タブの内容はフラグメントとして描画し、タブ内の操作ではそのタブだけを再実行する
     with tab1:
-        if st.session_state.genres:
-            st.header("提案されたジャンル")
-            
-            for i, genre in enumerate(st.session_state.genres):
-                col1, col2 = st.columns([1, 3])
-                
-                with col1:
-                    st.subheader(f"{i+1}. {genre.get('ジャンル名', 'ジャンル名なし')}")
-                    
-                    # 総合スコアを表示（分析済みの場合）
-                    if genre.get('ジャンル名') in st.session_state.final_scores:
-                        score = st.session_state.final_scores[genre.get('ジャンル名')]['総合スコア']
-                        st.metric("総合スコア", f"{score:.1f}/100")
-                
-                with col2:
-                    st.markdown(f"**説明**: {genre.get('説明', 'なし')}")
-                    st.markdown(f"**ターゲット層**: {genre.get('想定ターゲット層', 'なし')}")
-                    
-                    # キーワードをチップとして表示
-                    keywords = genre.get('関連するキーワード例', [])
-                    if keywords:
-                        st.markdown("**関連キーワード**:")
-                        keyword_html = '<div style="display:flex;flex-wrap:wrap;gap:5px;">'
-                        for kw in keywords:
-                            keyword_html += f'<div style="background-color:#f0f2f6;padding:5px 10px;border-radius:20px;font-size:0.8em;">{kw}</div>'
-                        keyword_html += '</div>'
-                        st.markdown(keyword_html, unsafe_allow_html=True)
-                
-                st.markdown("---")
-        else:
-            st.info("ジャンル候補はまだ生成されていません。サイドバーで設定を行い、「分析開始」ボタンをクリックしてください。")
-    
-    # タブ2の内容: 分析結果
+        _tab1_fragment()
     with tab2:
-        if st.session_state.final_scores:
-            st.header("分析結果")
-            
-            # 総合スコア順にジャンルをソート
-            sorted_genres = sorted(
-                st.session_state.final_scores.items(),
-                key=lambda x: x[1]['総合スコア'],
-                reverse=True
+        _tab2_fragment()
+    with tab3:
+        _tab3_fragment()
+
+def _sort_by_total_score(final_scores):
+    """総合スコア順にジャンルをソートする"""
+    return sorted(
+        final_scores.items(),
+        key=lambda x: x[1]['総合スコア'],
+        reverse=True
+    )
+
+def _to_display_df(rows, category_columns):
+    """
+    表示用のDataFrameを作成する
+    
+    Arrowバックエンドの型に変換し、値の種類が少ない文字列の列はカテゴリ型にして、ブラウザへの送信データを小さくする
+    """
+    df = pd.DataFrame(rows).convert_dtypes(dtype_backend="pyarrow")
+    for column in category_columns:
+        df[column] = df[column].astype("category")
+    return df
+
+@st.cache_data(show_spinner=False)
+def build_scores_df(final_scores):
+    """総合スコアの表を作成する（同じスコアに対しては再作成しない）"""
+    return _to_display_df([
+        {
+            'ジャンル': genre_name,
+            '総合スコア': data['総合スコア'],
+            '需要スコア': data['需要スコア'],
+            '競合の少なさ': data['競合の少なさスコア'],
+            'SNSスコア': data.get('SNSスコア')  # SNS分析を実行していない場合は欠損値（列をdouble型に保つ）
+        }
+        for genre_name, data in _sort_by_total_score(final_scores)
+    ], ['ジャンル'])
+
+@st.cache_data(show_spinner=False)
+def build_keyword_df(keyword_analysis):
+    """キーワードごとの需要データの表を作成する"""
+    return _to_display_df([
+        {
+            'キーワード': kw,
+            '平均関心度': data.get('トレンド情報', {}).get('平均関心度', 0),
+            'トレンド': data.get('トレンド情報', {}).get('トレンド', '不明'),
+            '月間検索ボリューム': data.get('月間検索ボリューム', 0)
+        }
+        for kw, data in keyword_analysis.items()
+    ], ['トレンド'])
+
+@st.cache_data(show_spinner=False)
+def build_competition_df(keyword_competition):
+    """キーワードごとの競合データの表を作成する"""
+    return _to_display_df([
+        {
+            'キーワード': kw,
+            '難易度': data.get('キーワード難易度', 0),
+            '競合サイト数': data.get('競合サイト数', 0),
+            'データソース': data.get('データソース', '不明')
+        }
+        for kw, data in keyword_competition.items()
+    ], ['データソース'])
+
+@st.cache_data(show_spinner=False)
+def build_social_df(keyword_social):
+    """キーワードごとのSNSデータの表を作成する"""
+    return _to_display_df([
+        {
+            'キーワード': kw,
+            'ツイート数': data.get('総ツイート数', 0),
+            'エンゲージメント率': data.get('平均エンゲージメント率', 0),
+            '感情傾向': data.get('感情傾向', '中立')
+        }
+        for kw, data in keyword_social.items()
+    ], ['感情傾向'])
+
+@st.cache_data(show_spinner=False)
+def build_bar_fig(scores_df):
+    """ジャンル別総合スコアの棒グラフを作成する"""
+    return px.bar(
+        scores_df,
+        x='ジャンル',
+        y='総合スコア',
+        title='ジャンル別総合スコア',
+        color='総合スコア',
+        color_continuous_scale='Viridis',
+    )
+
+@st.cache_data(show_spinner=False)
+def build_radar_fig(genre_name, values):
+    """ジャンルの詳細スコアのレーダーチャートを作成する"""
+    categories = ['需要スコア', '競合の少なさ', 'SNSスコア']
+    
+    fig = go.Figure()
+    
+    fig.add_trace(go.Scatterpolar(
+        r=list(values),
+        theta=categories,
+        fill='toself',
+        name=genre_name
+    ))
+    
+    fig.update_layout(
+        polar=dict(
+            radialaxis=dict(
+                visible=True,
+                range=[0, 100]
             )
+        ),
+        showlegend=False,
+        title=genre_name
+    )
+    
+    return fig
+
+@st.cache_data(show_spinner=False)
+def build_competition_scatter(comp_df):
+    """キーワード別競合状況の散布図を作成する（点が多い場合は競合サイト数の多い順に絞り込む）"""
+    if len(comp_df) > MAX_SCATTER_POINTS:
+        comp_df = comp_df.nlargest(MAX_SCATTER_POINTS, '競合サイト数')
+    
+    return px.scatter(
+        comp_df,
+        x='難易度',
+        y='競合サイト数',
+        size='競合サイト数',
+        color='キーワード',
+        title='キーワード別競合状況',
+        log_y=True
+    )
+
+@st.cache_data(show_spinner=False)
+def build_social_scatter(social_df):
+    """Twitter/X エンゲージメントの散布図を作成する（点が多い場合はツイート数の多い順に絞り込む）"""
+    if len(social_df) > MAX_SCATTER_POINTS:
+        social_df = social_df.nlargest(MAX_SCATTER_POINTS, 'ツイート数')
+    
+    return px.scatter(
+        social_df,
+        x='ツイート数',
+        y='エンゲージメント率',
+        size='ツイート数',
+        color='感情傾向',
+        hover_name='キーワード',
+        title='Twitter/X エンゲージメント分析'
+    )
+
+@st.fragment
+def _tab1_fragment():
+    """タブ1の内容: ジャンル候補一覧"""
+    if st.session_state.genres:
+        st.header("提案されたジャンル")
+        
+        for i, genre in enumerate(st.session_state.genres):
+            col1, col2 = st.columns([1, 3])
             
-            # スコアの表を作成
-            scores_df = pd.DataFrame([
-                {
-                    'ジャンル': genre_name,
-                    '総合スコア': data['総合スコア'],
-                    '需要スコア': data['需要スコア'],
-                    '競合の少なさ': data['競合の少なさスコア'],
-                    'SNSスコア': data.get('SNSスコア', 'N/A')
-                }
-                for genre_name, data in sorted_genres
-            ])
+            with col1:
+                st.subheader(f"{i+1}. {genre.get('ジャンル名', 'ジャンル名なし')}")
+                
+                # 総合スコアを表示（分析済みの場合）
+                if genre.get('ジャンル名') in st.session_state.final_scores:
+                    score = st.session_state.final_scores[genre.get('ジャンル名')]['総合スコア']
+                    st.metric("総合スコア", f"{score:.1f}/100")
             
-            # スコア表を表示
-            st.dataframe(scores_df, use_container_width=True)
+            with col2:
+                st.markdown(f"**説明**: {genre.get('説明', 'なし')}")
+                st.markdown(f"**ターゲット層**: {genre.get('想定ターゲット層', 'なし')}")
+                
+                # キーワードをチップとして表示
+                keywords = genre.get('関連するキーワード例', [])
+                if keywords:
+                    st.markdown("**関連キーワード**:")
+                    # unsafe_allow_html=Trueで描画するため、キーワードはエスケープする
+                    chips = ''.join(
+                        f'<div style="background-color:#f0f2f6;padding:5px 10px;border-radius:20px;font-size:0.8em;">{html.escape(kw)}</div>'
+                        for kw in keywords
+                    )
+                    keyword_html = f'<div style="display:flex;flex-wrap:wrap;gap:5px;">{chips}</div>'
+                    st.markdown(keyword_html, unsafe_allow_html=True)
             
-            # 棒グラフで総合スコアを表示
-            fig_bar = px.bar(
-                scores_df,
-                x='ジャンル',
-                y='総合スコア',
-                title='ジャンル別総合スコア',
-                color='総合スコア',
-                color_continuous_scale='Viridis',
-            )
-            st.plotly_chart(fig_bar, use_container_width=True)
+            st.markdown("---")
+    else:
+        st.info("ジャンル候補はまだ生成されていません。サイドバーで設定を行い、「分析開始」ボタンをクリックしてください。")
+
+@st.fragment
+def _tab2_fragment():
+    """タブ2の内容: 分析結果"""
+    if st.session_state.final_scores:
+        st.header("分析結果")
+        
+        # 総合スコア順にジャンルをソート
+        sorted_genres = _sort_by_total_score(st.session_state.final_scores)
+        
+        # スコアの表を作成
+        scores_df = build_scores_df(st.session_state.final_scores)
+        
+        # スコア表を表示
+        st.dataframe(scores_df, use_container_width=True)
+        
+        # 棒グラフで総合スコアを表示
+        st.plotly_chart(build_bar_fig(scores_df), use_container_width=True)
+        
+        # レーダーチャートで詳細スコアを表示
+        cols = st.columns(2)
+        
+        for i, (genre_name, data) in enumerate(sorted_genres[:4]):  # 上位4つのみ表示
+            if i % 2 == 0:
+                current_col = cols[0]
+            else:
+                current_col = cols[1]
             
-            # レーダーチャートで詳細スコアを表示
-            cols = st.columns(2)
+            with current_col:
+                values = (
+                    data['需要スコア'],
+                    data['競合の少なさスコア'],
+                    data.get('SNSスコア', 0)
+                )
+                st.plotly_chart(build_radar_fig(genre_name, values), use_container_width=True)
+    else:
+        st.info("分析結果はまだありません。サイドバーで設定を行い、「分析開始」ボタンをクリックしてください。")
+
+@st.fragment
+def _tab3_fragment():
+    """タブ3の内容: 詳細データ"""
+    if st.session_state.demand_data and st.session_state.competition_data:
+        st.header("詳細データ")
+        
+        # ジャンル選択
+        genre_names = list(st.session_state.demand_data.keys())
+        if genre_names:
+            selected_genre = st.selectbox("ジャンルを選択", genre_names)
             
-            for i, (genre_name, data) in enumerate(sorted_genres[:4]):  # 上位4つのみ表示
-                if i % 2 == 0:
-                    current_col = cols[0]
-                else:
-                    current_col = cols[1]
+            if selected_genre:
+                st.subheader(f"{selected_genre}の詳細データ")
                 
-                with current_col:
-                    categories = ['需要スコア', '競合の少なさ', 'SNSスコア']
-                    values = [
-                        data['需要スコア'],
-                        data['競合の少なさスコア'],
-                        data.get('SNSスコア', 0)
-                    ]
-                    
-                    fig = go.Figure()
-                    
-                    fig.add_trace(go.Scatterpolar(
-                        r=values,
-                        theta=categories,
-                        fill='toself',
-                        name=genre_name
-                    ))
-                    
-                    fig.update_layout(
-                        polar=dict(
-                            radialaxis=dict(
-                                visible=True,
-                                range=[0, 100]
-                            )
-                        ),
-                        showlegend=False,
-                        title=genre_name
-                    )
-                    
-                    st.plotly_chart(fig, use_container_width=True)
-        else:
-            st.info("分析結果はまだありません。サイドバーで設定を行い、「分析開始」ボタンをクリックしてください。")
-    
-    # タブ3の内容: 詳細データ
-    with tab3:
-        if st.session_state.demand_data and st.session_state.competition_data:
-            st.header("詳細データ")
-            
-            # ジャンル選択
-            genre_names = list(st.session_state.demand_data.keys())
-            if genre_names:
-                selected_genre = st.selectbox("ジャンルを選択", genre_names)
+                # 需要データ
+                st.markdown("### 需要分析")
+                demand_data = st.session_state.demand_data.get(selected_genre, {})
                 
-                if selected_genre:
-                    st.subheader(f"{selected_genre}の詳細データ")
-                    
-                    # 需要データ
-                    st.markdown("### 需要分析")
-                    demand_data = st.session_state.demand_data.get(selected_genre, {})
-                    
-                    # キーワードごとのデータを表示
-                    if 'キーワード分析' in demand_data:
-                        keyword_data = []
-                        for kw, data in demand_data['キーワード分析'].items():
-                            keyword_data.append({
-                                'キーワード': kw,
-                                '平均関心度': data.get('トレンド情報', {}).get('平均関心度', 0),
-                                'トレンド': data.get('トレンド情報', {}).get('トレンド', '不明'),
-                                '月間検索ボリューム': data.get('月間検索ボリューム', 0)
-                            })
+                # キーワードごとのデータを表示
+                if 'キーワード分析' in demand_data:
+                    if demand_data['キーワード分析']:
+                        kw_df = build_keyword_df(demand_data['キーワード分析'])
+                        st.dataframe(kw_df, use_container_width=True)
                         
-                        if keyword_data:
-                            kw_df = pd.DataFrame(keyword_data)
-                            st.dataframe(kw_df, use_container_width=True)
-                            
-                            # 検索ボリュームのグラフ
-                            fig = px.bar(
-                                kw_df,
-                                x='キーワード',
-                                y='月間検索ボリューム',
-                                title='キーワード別検索ボリューム',
-                                color='トレンド'
-                            )
-                            st.plotly_chart(fig, use_container_width=True)
-                    
-                    # 競合データ
-                    st.markdown("### 競合分析")
-                    competition_data = st.session_state.competition_data.get(selected_genre, {})
-                    
-                    if 'キーワード競合分析' in competition_data:
-                        comp_data = []
-                        for kw, data in competition_data['キーワード競合分析'].items():
-                            comp_data.append({
-                                'キーワード': kw,
-                                '難易度': data.get('キーワード難易度', 0),
-                                '競合サイト数': data.get('競合サイト数', 0),
-                                'データソース': data.get('データソース', '不明')
-                            })
+                        # 検索ボリュームのグラフ
+                        fig = px.bar(
+                            kw_df,
+                            x='キーワード',
+                            y='月間検索ボリューム',
+                            title='キーワード別検索ボリューム',
+                            color='トレンド'
+                        )
+                        st.plotly_chart(fig, use_container_width=True)
+                
+                # 競合データ
+                st.markdown("### 競合分析")
+                competition_data = st.session_state.competition_data.get(selected_genre, {})
+                
+                if 'キーワード競合分析' in competition_data:
+                    if competition_data['キーワード競合分析']:
+                        comp_df = build_competition_df(competition_data['キーワード競合分析'])
+                        st.dataframe(comp_df, use_container_width=True)
                         
-                        if comp_data:
-                            comp_df = pd.DataFrame(comp_data)
-                            st.dataframe(comp_df, use_container_width=True)
-                            
-                            # 難易度のグラフ
-                            fig = px.scatter(
-                                comp_df,
-                                x='難易度',
-                                y='競合サイト数',
-                                size='競合サイト数',
-                                color='キーワード',
-                                title='キーワード別競合状況',
-                                log_y=True
-                            )
-                            st.plotly_chart(fig, use_container_width=True)
+                        # 難易度のグラフ
+                        st.plotly_chart(build_competition_scatter(comp_df), use_container_width=True, theme=None)
+                
+                # SNSデータ（存在する場合）
+                if selected_genre in st.session_state.social_data:
+                    st.markdown("### SNS分析")
+                    social_data = st.session_state.social_data.get(selected_genre, {})
                     
-                    # SNSデータ（存在する場合）
-                    if selected_genre in st.session_state.social_data:
-                        st.markdown("### SNS分析")
-                        social_data = st.session_state.social_data.get(selected_genre, {})
-                        
-                        if 'SNS分析' in social_data:
-                            social_data_list = []
-                            for kw, data in social_data['SNS分析'].items():
-                                social_data_list.append({
-                                    'キーワード': kw,
-                                    'ツイート数': data.get('総ツイート数', 0),
-                                    'エンゲージメント率': data.get('平均エンゲージメント率', 0),
-                                    '感情傾向': data.get('感情傾向', '中立')
-                                })
+                    if 'SNS分析' in social_data:
+                        if social_data['SNS分析']:
+                            social_df = build_social_df(social_data['SNS分析'])
+                            st.dataframe(social_df, use_container_width=True)
                             
-                            if social_data_list:
-                                social_df = pd.DataFrame(social_data_list)
-                                st.dataframe(social_df, use_container_width=True)
-                                
-                                # ツイート数とエンゲージメントのグラフ
-                                fig = px.scatter(
-                                    social_df,
-                                    x='ツイート数',
-                                    y='エンゲージメント率',
-                                    size='ツイート数',
-                                    color='感情傾向',
-                                    hover_name='キーワード',
-                                    title='Twitter/X エンゲージメント分析'
-                                )
-                                st.plotly_chart(fig, use_container_width=True)
-            else:
-                st.info("ジャンルデータがありません。")
+                            # ツイート数とエンゲージメントのグラフ
+                            st.plotly_chart(build_social_scatter(social_df), use_container_width=True, theme=None)
         else:
-            st.info("詳細データはまだ生成されていません。サイドバーで設定を行い、「分析開始」ボタンをクリックしてください。")
+            st.info("ジャンルデータがありません。")
+    else:
+        st.info("詳細データはまだ生成されていません。サイドバーで設定を行い、「分析開始」ボタンをクリックしてください。")
 
 def calculate_final_scores():
     """総合スコアを計算する関数"""
     final_scores = {}
     
-    for genre_name in st.session_state.demand_data.keys():
+    # セッション状態はループの外で一度だけ参照する
+    demand_data = st.session_state.demand_data
+    competition_data = st.session_state.competition_data
+    social_data = st.session_state.social_data
+    
+    for genre_name in demand_data.keys():
+        has_social = genre_name in social_data
+        
         # 各スコアを取得
-        demand_score = st.session_state.demand_data.get(genre_name, {}).get('需要スコア', 0)
-        competition_score = st.session_state.competition_data.get(genre_name, {}).get('競合の少なさスコア', 0)
-        social_score = st.session_state.social_data.get(genre_name, {}).get('SNSスコア', 0) if genre_name in st.session_state.social_data else 0
+        demand_score = demand_data.get(genre_name, {}).get('需要スコア', 0)
+        competition_score = competition_data.get(genre_name, {}).get('競合の少なさスコア', 0)
+        social_score = social_data[genre_name].get('SNSスコア', 0) if has_social else 0
         
         # 重み付けした総合スコアを計算
         # 需要: 40%, 競合: 40%, SNS: 20%
-        if genre_name in st.session_state.social_data:
+        if has_social:
             total_score = (demand_score * 0.4) + (competition_score * 0.4) + (social_score * 0.2)
         else:
             # SNSデータがない場合は需要と競合のみで計算
@@ -343,7 +496,7 @@ def calculate_final_scores():
             '競合の少なさスコア': competition_score
         }
         
-        if genre_name in st.session_state.social_data:
+        if has_social:
             final_scores[genre_name]['SNSスコア'] = social_score
     
     st.session_state.final_scores = final_scores
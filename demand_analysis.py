@@ -1,9 +1,82 @@
 from pytrends.request import TrendReq
 import pandas as pd
+import numpy as np
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from googleapiclient.discovery import build
 import json
 
+from api_cache import cache, TRENDS_TTL, VOLUME_TTL
+
+# Google Trendsへの同時リクエスト数（1秒あたりのリクエスト数の上限を兼ねる）
+TRENDS_MAX_WORKERS = 4
+_trends_semaphore = threading.Semaphore(TRENDS_MAX_WORKERS)
+_thread_local = threading.local()
+
+# ワーカースレッドをプロセス内で使い回し、スレッドごとのTrendReq（セッションとCookie）を呼び出し間で再利用する
+_trends_executor = ThreadPoolExecutor(max_workers=TRENDS_MAX_WORKERS, thread_name_prefix="pytrends")
+
+def _get_pytrends():
+    """スレッドごとにTrendReqを生成して返す（TrendReqはスレッドセーフではないため。生成は各スレッドで初回のみ）"""
+    if not hasattr(_thread_local, "pytrends"):
+        _thread_local.pytrends = TrendReq(hl='ja-JP', tz=540)  # 日本のタイムゾーン (UTC+9)
+    return _thread_local.pytrends
+
+def _fetch_group(group, timeframe='today 12-m', geo='JP'):
+    """
+    最大5つのキーワードのグループについてGoogle Trendsのデータを取得する
+    
+    Parameters:
+    group (list): キーワードのグループ（最大5つ）
+    timeframe (str): 分析する期間
+    geo (str): 地域コード
+    
+    Returns:
+    dict: キーワードごとの平均関心度とトレンド（上昇/下降）
+    """
+    cache_key = ("trends", tuple(group), timeframe, geo)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    result = {}
+    try:
+        # Google Trendsのレート制限を避けるため、同時実行数を制限し各リクエストに最低1秒を割り当てる
+        with _trends_semaphore:
+            started = time.monotonic()
+            pytrends = _get_pytrends()
+            pytrends.build_payload(group, cat=0, timeframe=timeframe, geo=geo)
+            interest_over_time = pytrends.interest_over_time()
+            time.sleep(max(0, 1 - (time.monotonic() - started)))
+        
+        # グループ内のキーワードをまとめて集計（行: 期間、列: キーワード）
+        columns = [keyword for keyword in group if keyword in interest_over_time.columns]
+        if not interest_over_time.empty and columns:
+            values = interest_over_time[columns].to_numpy(dtype=float)
+            avg_interests = values.mean(axis=0)
+            
+            # トレンド判定（線形回帰の傾きで上昇/下降を判断）
+            if values.shape[0] > 1:
+                slopes = np.polyfit(np.arange(values.shape[0]), values, 1)[0]
+                # 横ばいの系列でも丸め誤差でわずかに正の傾きになるため、許容誤差を超えた場合だけ上昇とする
+                trends = np.where(slopes > 1e-9, "上昇", "下降")
+            else:
+                trends = ["不明"] * len(columns)
+            
+            for keyword, avg_interest, trend in zip(columns, avg_interests, trends):
+                result[keyword] = {
+                    "平均関心度": float(avg_interest),
+                    "トレンド": str(trend)
+                }
+        
+        cache.set(cache_key, result, expire=TRENDS_TTL)
+        
+    except Exception as e:
+        print(f"Google Trendsエラー: {e}")
+    
+    return result
+
 def analyze_trends(keywords, timeframe='today 12-m', geo='JP'):
     """
     Google Trendsを使用してキーワードの検索トレンドを分析する
@@ -17,43 +90,17 @@ def analyze_trends(keywords, timeframe='today 12-m', geo='JP'):
     dict: キーワードごとの平均関心度とトレンド（上昇/下降）
     """
     result = {}
-    pytrends = TrendReq(hl='ja-JP', tz=540)  # 日本のタイムゾーン (UTC+9)
     
-    # キーワードを5つずつグループ化（Google Trendsの制限）
-    keyword_groups = [keywords[i:i+5] for i in range(0, len(keywords), 5)]
-    
-    for group in keyword_groups:
-        try:
-            pytrends.build_payload(group, cat=0, timeframe=timeframe, geo=geo)
-            interest_over_time = pytrends.interest_over_time()
-            
-            if not interest_over_time.empty:
-                for keyword in group:
-                    if keyword in interest_over_time.columns:
-                        values = interest_over_time[keyword].values
-                        avg_interest = values.mean()
-                        
-                        # トレンド判定（単純な線形回帰で上昇/下降を判断）
-                        if len(values) > 1:
-                            first_half = values[:len(values)//2].mean()
-                            second_half = values[len(values)//2:].mean()
-                            trend = "上昇" if second_half > first_half else "下降"
-                        else:
-                            trend = "不明"
-                        
-                        result[keyword] = {
-                            "平均関心度": float(avg_interest),
-                            "トレンド": trend
-                        }
-            
-            # Google Trendsのレート制限を避けるための待機
-            time.sleep(1)
-            
-        except Exception as e:
-            print(f"Google Trendsエラー: {e}")
+    # pytrendsはブロッキングI/Oなので、グループごとのリクエストをスレッドで並行実行する
+    for part in _trends_executor.map(lambda group: _fetch_group(group, timeframe, geo), _keyword_groups(keywords)):
+        result.update(part)
     
     return result
 
+def _keyword_groups(keywords):
+    """キーワードを5つずつグループ化する（Google Trendsの制限）"""
+    return [keywords[i:i+5] for i in range(0, len(keywords), 5)]
+
 def get_search_volume(keywords, api_key):
     """
     Google Ads APIを使用してキーワードの検索ボリュームを取得する
@@ -69,18 +116,29 @@ def get_search_volume(keywords, api_key):
     # このコードは簡略化されたもので、実際の実装では適切な認証が必要です
     
     # 模擬的なデータを返す関数（実際の実装ではGoogle Ads APIを呼び出す）
-    def mock_search_volume(keyword):
-        import random
+    def mock_search_volume(keywords):
         # 実際の実装では、この部分をGoogle Ads APIの呼び出しに置き換える
-        return random.randint(500, 10000)
+        # （APIを呼び出す場合は、レート制限を考慮した待機もここに入れる）
+        rng = np.random.default_rng()
+        return rng.integers(500, 10000, size=len(keywords), endpoint=True).tolist()
     
     result = {}
+    
+    # キャッシュにあればAPIを呼ばない（キャッシュキーにはAPIキーを含めない）
+    missing = []
     for keyword in keywords:
+        volume = cache.get(("volume", keyword))
+        if volume is not None:
+            result[keyword] = volume
+        else:
+            missing.append(keyword)
+    
+    if missing:
         try:
             # 実際はここでGoogle Ads APIを呼び出す
-            volume = mock_search_volume(keyword)
-            result[keyword] = volume
-            time.sleep(0.5)  # APIレート制限を考慮
+            for keyword, volume in zip(missing, mock_search_volume(missing)):
+                result[keyword] = volume
+                cache.set(("volume", keyword), volume, expire=VOLUME_TTL)
         except Exception as e:
             print(f"検索ボリューム取得エラー: {e}")
     
@@ -126,7 +184,8 @@ def analyze_demand(genres, google_api_key):
         print(f"データの内容: {genres}")
         return {}
     
-    # ここでジャンル情報をループ処理
+    # ここでジャンル情報をループ処理し、分析対象のジャンル名とキーワードを取り出す
+    targets = []
     for genre in genres:
         # genreが辞書でなければスキップ
         if not isinstance(genre, dict):
@@ -147,10 +206,16 @@ def analyze_demand(genres, google_api_key):
             
         if not keywords:
             continue
-            
-        # Google Trendsで分析
-        trends_data = analyze_trends(keywords)
         
+        targets.append((genre_name, keywords))
+    
+    # Google Trendsで分析（全ジャンルのキーワードグループをまとめてスレッドプールに渡し、ジャンルをまたいで並行して取得する）
+    groups = [(index, group) for index, (_, keywords) in enumerate(targets) for group in _keyword_groups(keywords)]
+    trends_by_genre = [{} for _ in targets]
+    for (index, _), part in zip(groups, _trends_executor.map(lambda item: _fetch_group(item[1]), groups)):
+        trends_by_genre[index].update(part)
+    
+    for (genre_name, keywords), trends_data in zip(targets, trends_by_genre):
         # 検索ボリュームを取得
         search_volume = get_search_volume(keywords, google_api_key)
         
@@ -168,9 +233,13 @@ def analyze_demand(genres, google_api_key):
             genre_result["キーワード分析"][keyword] = keyword_result
         
         # ジャンル全体のスコア計算（単純な平均）
-        avg_interest = sum([trends_data.get(k, {}).get("平均関心度", 0) for k in keywords]) / len(keywords) if keywords else 0
-        avg_volume = sum([search_volume.get(k, 0) for k in keywords]) / len(keywords) if keywords else 0
-        trend_score = len([k for k in keywords if trends_data.get(k, {}).get("トレンド", "") == "上昇"]) / len(keywords) if keywords else 0
+        interests = np.fromiter((trends_data.get(k, {}).get("平均関心度", 0) for k in keywords), dtype=np.float64, count=len(keywords))
+        volumes = np.fromiter((search_volume.get(k, 0) for k in keywords), dtype=np.float64, count=len(keywords))
+        trends = np.array([trends_data.get(k, {}).get("トレンド", "") for k in keywords])
+        
+        avg_interest = float(interests.mean()) if interests.size else 0
+        avg_volume = float(volumes.mean()) if volumes.size else 0
+        trend_score = float((trends == "上昇").mean()) if trends.size else 0
         
         genre_result["需要スコア"] = (avg_interest * 0.3) + (avg_volume * 0.5) + (trend_score * 100 * 0.2)
         
@@ -1,122 +1,363 @@
 import os
+import time
 import anthropic
-import json
+import orjson
 
-def suggest_genres(api_key, num_suggestions=10):
+# レート制限（429）・過負荷（529）・サーバーエラー・接続エラー時の再試行回数
+# （SDKが指数バックオフとジッターで再試行し、Retry-Afterヘッダーがあればそれに従う）
+CLAUDE_MAX_RETRIES = 5
+
+# 最大出力トークン数の上限
+MAX_TOKENS = 4096
+
+# Claude APIに渡すシステムプロンプト
+SYSTEM_PROMPT = "あなたは日本のアフィリエイトマーケティングの専門家です。創造的で実用的なアイデアを提供します。"
+
+# ジャンル提案用のプロンプト（{num_suggestions}に提案数を埋め込む）
+PROMPT_TEMPLATE = """
+日本のアフィリエイトマーケティングにおいて、以下の条件を満たす有望なジャンルを{num_suggestions}個リストアップし、JSONフォーマットで返してください：
+
+1. 十分なニーズがある（または今後成長が見込める）
+2. 比較的競合が少ない
+3. アフィリエイト収益化が可能
+
+以下の形式のJSONで出力してください:
+
+{{
+  "genres": [
+    {{
+      "ジャンル名": "ジャンル1",
+      "説明": "このジャンルが有望な理由",
+      "想定ターゲット層": "このジャンルの対象となる人々",
+      "関連するキーワード例": ["キーワード1", "キーワード2", "キーワード3", "キーワード4", "キーワード5"]
+    }},
+    ... 追加のジャンル ...
+  ]
+}}
+
+厳密にJSON形式で出力してください。他の説明は不要です。
+"""
+
+# ジャンル情報として利用するフィールド
+GENRE_FIELDS = ("ジャンル名", "説明", "想定ターゲット層", "関連するキーワード例")
+
+def suggest_genres(api_key, num_suggestions=10, use_batch=False):
     """
     Claude 3.7 Sonnet APIを使用して潜在的なアフィリエイトマーケティングのジャンルを提案する
     
     Parameters:
     api_key (str): Anthropic API Key
     num_suggestions (int): 提案するジャンルの数
+    use_batch (bool): Message Batches APIを使用するか（結果の取得に時間がかかる代わりに料金が半額になる）
     
     Returns:
     list: 提案されたジャンルのリスト（各ジャンルは辞書形式でジャンル名、説明、想定ターゲット層を含む）
     """
+    if not use_batch:
+        return list(stream_genres(api_key, num_suggestions))
+    
     try:
-        client = anthropic.Anthropic(api_key=api_key)
-        
-        prompt = f"""
-        日本のアフィリエイトマーケティングにおいて、以下の条件を満たす有望なジャンルを{num_suggestions}個リストアップし、JSONフォーマットで返してください：
-        
-        1. 十分なニーズがある（または今後成長が見込める）
-        2. 比較的競合が少ない
-        3. アフィリエイト収益化が可能
-        
-        以下の形式のJSONで出力してください:
-
-        {{
-          "genres": [
-            {{
-              "ジャンル名": "ジャンル1",
-              "説明": "このジャンルが有望な理由",
-              "想定ターゲット層": "このジャンルの対象となる人々",
-              "関連するキーワード例": ["キーワード1", "キーワード2", "キーワード3", "キーワード4", "キーワード5"]
-            }},
-            ... 追加のジャンル ...
-          ]
-        }}
-        
-        厳密にJSON形式で出力してください。他の説明は不要です。
-        """
+        prompt = PROMPT_TEMPLATE.format(num_suggestions=num_suggestions)
+        return suggest_genres_batch(api_key, [prompt], max_tokens=_max_tokens(num_suggestions))[0]
+    except Exception as e:
+        print(f"エラー発生: {type(e).__name__}: {e}")
+        # エラー時にはダミーデータを返す
+        return _dummy_genres()
+
+def stream_genres(api_key, num_suggestions=10):
+    """
+    Claude APIのストリーミングレスポンスを逐次解析し、ジャンルが1つ生成されるごとに返す
+    
+    ストリーミングの途中でエラーが発生した場合は、それまでに返したジャンルだけで終了する。
+    逐次解析でジャンルを取り出せなかった場合はレスポンス全体から抽出し、
+    1つも返せないままエラーが発生した場合はダミーデータを返す
+    
+    Parameters:
+    api_key (str): Anthropic API Key
+    num_suggestions (int): 提案するジャンルの数
+    
+    Yields:
+    dict: 提案されたジャンル（ジャンル名、説明、想定ターゲット層、関連するキーワード例）
+    """
+    parser = GenreStreamParser()
+    count = 0
+    try:
+        client = anthropic.Anthropic(api_key=api_key, max_retries=CLAUDE_MAX_RETRIES)
+        prompt = PROMPT_TEMPLATE.format(num_suggestions=num_suggestions)
         
         print("Claude APIリクエスト送信中...")
-        message = client.messages.create(
-            model="claude-3-7-sonnet-20250219",
-            max_tokens=4000,
-            temperature=0.7,
-            system="あなたは日本のアフィリエイトマーケティングの専門家です。創造的で実用的なアイデアを提供します。",
-            messages=[
-                {"role": "user", "content": prompt}
-            ]
-        )
+        for genre in _stream_genres(client, prompt, parser, _max_tokens(num_suggestions)):
+            count += 1
+            yield genre
         
         print("APIレスポンス受信")
-        response_content = message.content[0].text
+        response_content = parser.text
         
         # デバッグ出力
         print("APIレスポンス:")
         print(response_content[:500] + "..." if len(response_content) > 500 else response_content)
         
-        # JSON部分を抽出
-        json_start = response_content.find('{')
-        json_end = response_content.rfind('}') + 1
-        if json_start >= 0 and json_end > json_start:
-            json_str = response_content[json_start:json_end]
-            
-            # デバッグ出力
-            print("\n抽出されたJSON:")
-            print(json_str[:500] + "..." if len(json_str) > 500 else json_str)
-            
-            try:
-                # JSON解析
-                result = json.loads(json_str)
-                
-                # 結果の構造を確認
-                if isinstance(result, dict) and "genres" in result and isinstance(result["genres"], list):
-                    print(f"成功: {len(result['genres'])}個のジャンルを取得")
-                    return result["genres"]
-                else:
-                    print("予期しない形式のJSON:")
-                    print(result)
-                    # 辞書の形式によっては、適切なキーを探すか、適切な形式に変換
-                    if isinstance(result, dict) and any(isinstance(v, list) for v in result.values()):
-                        # 辞書内の最初のリストを返す
-                        for key, value in result.items():
-                            if isinstance(value, list):
-                                print(f"キー '{key}' からリスト形式のデータを取得")
-                                return value
-                    
-                    # 他の形式から変換を試みる
-                    if isinstance(result, dict):
-                        return [result]  # 単一の辞書を要素とするリストに変換
-                    elif isinstance(result, list):
-                        return result    # すでにリスト形式なのでそのまま返す
-                    else:
-                        print("サポートされていない形式")
-                        return []
-            except json.JSONDecodeError as e:
-                print(f"JSON解析エラー: {e}")
-                # JSONとして解析できない場合、ダミーデータを返す
-                return [
-                    {
-                        "ジャンル名": "サステナブルファッション",
-                        "説明": "環境に配慮した衣料品やアクセサリーは需要増加中",
-                        "想定ターゲット層": "20-40代の環境意識の高い女性",
-                        "関連するキーワード例": ["エシカルファッション", "サステナブル衣料", "リサイクルファッション", "エコフレンドリー服", "フェアトレード衣料"]
-                    }
-                ]
+        if count:
+            print(f"成功: {count}個のジャンルを取得")
         else:
-            print("JSONが見つかりませんでした")
-            return []
+            # 逐次解析でジャンルを取り出せなかった場合は、レスポンス全体から抽出する
+            yield from _extract_genres(response_content)
     except Exception as e:
+        if count:
+            # ストリーミングの途中でエラーが発生した場合は、それまでに取得できたジャンルを使う
+            print(f"ストリーミング中にエラー発生（取得済みの{count}個のジャンルを使用）: {type(e).__name__}: {e}")
+            return
         print(f"エラー発生: {type(e).__name__}: {e}")
         # エラー時にはダミーデータを返す
-        return [
-            {
-                "ジャンル名": "サステナブルファッション",
-                "説明": "環境に配慮した衣料品やアクセサリーは需要増加中",
-                "想定ターゲット層": "20-40代の環境意識の高い女性",
-                "関連するキーワード例": ["エシカルファッション", "サステナブル衣料", "リサイクルファッション", "エコフレンドリー服", "フェアトレード衣料"]
-            }
-        ]
\ No newline at end of file
+        yield from _dummy_genres()
+
+def _stream_genres(client, prompt, parser, max_tokens=MAX_TOKENS):
+    """ストリーミングで受信したテキストをparserに渡し、閉じたジャンルから順に返す"""
+    with client.messages.stream(**_message_params(prompt, max_tokens)) as stream:
+        for text in stream.text_stream:
+            for genre in parser.feed(text):
+                yield _project_genre(genre)
+
+class GenreStreamParser:
+    """
+    ストリーミングで受信したJSONテキストを逐次解析し、最上位オブジェクト内の最初の配列
+    （"genres"）または最上位の配列の要素が閉じた時点でその要素を取り出す
+    """
+    
+    def __init__(self):
+        self.text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._array_depth = None  # 配列の要素が置かれる深さ（配列が閉じた後は-1）
+        self._element_start = None
+        self._element_count = 0
+    
+    def feed(self, chunk):
+        """
+        受信したテキストを追加し、新たに閉じた要素を返す
+        
+        Parameters:
+        chunk (str): 受信したテキスト
+        
+        Returns:
+        list: 新たに閉じた要素のリスト
+        """
+        self.text += chunk
+        text = self.text
+        elements = []
+        
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            
+            # 文字列内の括弧は構造として扱わない
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+            
+            if ch == '"':
+                self._in_string = True
+            elif ch == "{" or ch == "[":
+                if ch == "[" and self._depth <= 1 and self._array_depth is None:
+                    self._array_depth = self._depth + 1
+                elif ch == "{" and self._depth == self._array_depth:
+                    self._element_start = i
+                self._depth += 1
+            elif ch == "}" or ch == "]":
+                self._depth -= 1
+                if ch == "}" and self._element_start is not None and self._depth == self._array_depth:
+                    try:
+                        elements.append(orjson.loads(text[self._element_start:i + 1]))
+                        self._element_count += 1
+                    except orjson.JSONDecodeError as e:
+                        print(f"JSON解析エラー: {e}")
+                    self._element_start = None
+                elif ch == "]" and self._array_depth is not None and self._depth == self._array_depth - 1:
+                    # 要素を含まない配列（前置きの文章中の[...]など）だった場合は、次の配列を探し直す
+                    self._array_depth = -1 if self._element_count else None
+        
+        self._pos = len(text)
+        return elements
+
+def suggest_genres_batch(api_key, prompts, poll_interval=10, max_tokens=MAX_TOKENS):
+    """
+    Message Batches APIを使用して複数のプロンプトをまとめて送信し、ジャンルの提案を取得する
+    （結果の取得までに時間がかかる代わりに、料金が通常の半額になる）
+    
+    Parameters:
+    api_key (str): Anthropic API Key
+    prompts (list): 送信するプロンプトのリスト
+    poll_interval (int): バッチの処理状況を確認する間隔（秒）
+    max_tokens (int): 各プロンプトの最大出力トークン数
+    
+    Returns:
+    list: プロンプトごとのジャンルのリスト（promptsと同じ順序。失敗したプロンプトは空のリスト）
+    """
+    client = anthropic.Anthropic(api_key=api_key, max_retries=CLAUDE_MAX_RETRIES)
+    
+    print(f"Claude APIバッチリクエスト送信中... ({len(prompts)}件)")
+    batch = client.messages.batches.create(
+        requests=[
+            {"custom_id": f"g{i}", "params": _message_params(prompt, max_tokens)}
+            for i, prompt in enumerate(prompts)
+        ]
+    )
+    
+    # バッチの処理が終わるまで待機
+    while batch.processing_status != "ended":
+        time.sleep(poll_interval)
+        batch = client.messages.batches.retrieve(batch.id)
+    
+    print("バッチ処理完了")
+    
+    # 結果はリクエストの順序で返されるとは限らないため、custom_idで対応付ける
+    results = [[] for _ in prompts]
+    for entry in client.messages.batches.results(batch.id):
+        if entry.result.type == "succeeded":
+            results[int(entry.custom_id[1:])] = _genres_from_text(entry.result.message.content[0].text)
+        else:
+            print(f"バッチリクエストエラー ({entry.custom_id}): {entry.result.type}")
+    
+    return results
+
+def _max_tokens(num_suggestions):
+    """提案数に応じた最大出力トークン数（ジャンル1つあたり約250トークン＋JSONの外枠）"""
+    return min(MAX_TOKENS, 300 + 250 * num_suggestions)
+
+def _message_params(prompt, max_tokens=MAX_TOKENS):
+    """Claude APIに送信するメッセージのパラメータを作成する"""
+    return {
+        "model": "claude-3-7-sonnet-20250219",
+        "max_tokens": max_tokens,
+        "temperature": 0.7,
+        "system": SYSTEM_PROMPT,
+        "messages": [
+            {"role": "user", "content": prompt}
+        ]
+    }
+
+def _slice_top_level_json(text):
+    """
+    テキスト中の最初のJSONオブジェクトまたは配列（最初の{または[から対応する括弧まで）を切り出す
+    
+    文字列内の括弧は数えないため、キーワードや説明文に}が含まれていても正しく切り出せる。
+    閉じていない場合は開始位置以降をすべて返す（解析エラーとして扱われる）
+    
+    Parameters:
+    text (str): Claude APIのレスポンス
+    
+    Returns:
+    str: JSONオブジェクトまたは配列の文字列（{も[も見つからない場合は空文字列）
+    """
+    starts = [i for i in (text.find('{'), text.find('[')) if i >= 0]
+    if not starts:
+        return ""
+    start = min(starts)
+    
+    depth = 0
+    in_string = False
+    escape = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "{" or ch == "[":
+            depth += 1
+        elif ch == "}" or ch == "]":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    
+    return text[start:]
+
+def _genres_from_text(response_content):
+    """
+    レスポンス全体のテキストからジャンルのリストを取り出す
+    
+    max_tokensで途中で打ち切られたレスポンスでも、閉じているジャンルは逐次解析で取り出せる。
+    取り出せなかった場合は_extract_genresで抽出する
+    """
+    genres = [_project_genre(genre) for genre in GenreStreamParser().feed(response_content)]
+    if genres:
+        print(f"成功: {len(genres)}個のジャンルを取得")
+        return genres
+    return _extract_genres(response_content)
+
+def _extract_genres(response_content):
+    """Claude APIのレスポンスからJSON部分を抽出し、ジャンルのリストに変換する"""
+    # JSON部分を抽出
+    json_str = _slice_top_level_json(response_content)
+    if json_str:
+        
+        # デバッグ出力
+        print("\n抽出されたJSON:")
+        print(json_str[:500] + "..." if len(json_str) > 500 else json_str)
+        
+        try:
+            # JSON解析
+            result = orjson.loads(json_str)
+            
+            # 結果の構造を確認
+            if isinstance(result, dict) and "genres" in result and isinstance(result["genres"], list):
+                print(f"成功: {len(result['genres'])}個のジャンルを取得")
+                return [_project_genre(genre) for genre in result["genres"]]
+            else:
+                print("予期しない形式のJSON:")
+                print(result)
+                # 辞書の形式によっては、適切なキーを探すか、適切な形式に変換
+                if isinstance(result, dict):
+                    # 辞書内の最初のジャンル（辞書）のリストを返す
+                    for key, value in result.items():
+                        if _is_genre_list(value):
+                            print(f"キー '{key}' からリスト形式のデータを取得")
+                            return [_project_genre(genre) for genre in value]
+                
+                # 他の形式から変換を試みる
+                if isinstance(result, dict):
+                    return [result]  # 単一の辞書を要素とするリストに変換
+                elif _is_genre_list(result):
+                    return [_project_genre(genre) for genre in result]  # すでにリスト形式なのでそのまま返す
+                else:
+                    print("サポートされていない形式")
+                    return []
+        except orjson.JSONDecodeError as e:
+            print(f"JSON解析エラー: {e}")
+            # JSONとして解析できない場合、ダミーデータを返す
+            return _dummy_genres()
+    else:
+        print("JSONが見つかりませんでした")
+        return []
+
+def _dummy_genres():
+    """ジャンルを取得できなかった場合のダミーデータ"""
+    return [
+        {
+            "ジャンル名": "サステナブルファッション",
+            "説明": "環境に配慮した衣料品やアクセサリーは需要増加中",
+            "想定ターゲット層": "20-40代の環境意識の高い女性",
+            "関連するキーワード例": ["エシカルファッション", "サステナブル衣料", "リサイクルファッション", "エコフレンドリー服", "フェアトレード衣料"]
+        }
+    ]
+
+def _is_genre_list(value):
+    """ジャンル（辞書）のリストかどうか（キーワードなど文字列のリストは対象外）"""
+    return isinstance(value, list) and bool(value) and all(isinstance(item, dict) for item in value)
+
+def _project_genre(genre):
+    """ジャンル情報から利用するフィールドだけを取り出す"""
+    if not isinstance(genre, dict):
+        return genre
+    return {field: genre[field] for field in GENRE_FIELDS if field in genre}
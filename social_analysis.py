@@ -1,9 +1,114 @@
-import requests
-import json
+import asyncio
+import collections.abc
+import datetime
+import email.utils
+import functools
+import hashlib
+import httpx
+import math
+import orjson
+import random
+import re
 import time
-import os
-from dotenv import load_dotenv
-import pandas as pd
+import numpy as np
+from api_cache import cache, TWITTER_TTL
+
+# Twitter APIリクエストの同時実行数
+MAX_CONCURRENT_REQUESTS = 5
+
+# レート制限（429）や一時的なエラーが返された場合の再試行回数
+MAX_RETRIES = 3
+
+# ツイート件数API（counts/recent）の15分あたりのリクエスト数の上限
+TWEET_COUNTS_RATE_LIMIT = 300
+
+# 再試行するステータスコード（レート制限・一時的なサーバーエラー）
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# 再試行までの待機時間の上限（秒）
+MAX_RETRY_WAIT = 30
+
+# 一般的な話題（ツイート数が多いと仮定するキーワード）
+COMMON_TOPICS = ["食べ物", "旅行", "アニメ", "ゲーム", "健康", "スポーツ"]
+_COMMON_TOPICS_PATTERN = re.compile("|".join(map(re.escape, COMMON_TOPICS)))
+
+# モックデータの感情傾向と出現確率（多くのツイートは中立か肯定的）
+SENTIMENT_OPTIONS = ["ポジティブ", "やや肯定的", "中立", "やや否定的", "ネガティブ"]
+SENTIMENT_WEIGHTS = [0.2, 0.3, 0.3, 0.15, 0.05]
+
+# 感情傾向をスコア化（ポジティブ: 1.0, やや肯定的: 0.5, 中立: 0, やや否定的: -0.5, ネガティブ: -1.0）
+SENTIMENT_SCORES = {
+    "ポジティブ": 1.0,
+    "やや肯定的": 0.5,
+    "中立": 0.0,
+    "やや否定的": -0.5,
+    "ネガティブ": -1.0
+}
+
+class TwitterRateLimiter:
+    """
+    Twitter APIのレート制限（15分ごとのリクエスト数）に合わせてリクエストを制限する
+    
+    残りリクエスト数がある間は待機せず、使い切った場合だけウィンドウのリセットまで待機する。
+    残りリクエスト数とリセット時刻はAPIのレスポンスヘッダーで随時更新する
+    """
+    
+    def __init__(self, capacity=180, window=900):
+        self.capacity = capacity
+        self.window = window
+        self.remaining = capacity
+        self.reset_at = time.monotonic() + window
+        self._lock = asyncio.Lock()
+        self._endpoints = {}
+    
+    def for_endpoint(self, endpoint, capacity):
+        """
+        別のエンドポイント用のレート制限を返す（Twitter APIのレート制限はエンドポイントごとに管理される）
+        
+        同じエンドポイントに対しては、同じインスタンスを返す
+        """
+        if endpoint not in self._endpoints:
+            self._endpoints[endpoint] = TwitterRateLimiter(capacity, self.window)
+        return self._endpoints[endpoint]
+    
+    async def acquire(self):
+        """リクエスト1回分の枠を取得する（枠がなければリセットまで待機する）"""
+        async with self._lock:
+            if time.monotonic() >= self.reset_at:
+                self.remaining = self.capacity
+                self.reset_at = time.monotonic() + self.window
+            
+            if self.remaining <= 0:
+                await asyncio.sleep(max(0, self.reset_at - time.monotonic()))
+                self.remaining = self.capacity
+                self.reset_at = time.monotonic() + self.window
+            
+            self.remaining -= 1
+    
+    def update_from_headers(self, response):
+        """レスポンスヘッダー（x-rate-limit-*）から上限・残りリクエスト数・リセット時刻を更新する"""
+        headers = response.headers
+        if "x-rate-limit-limit" in headers:
+            self.capacity = int(headers["x-rate-limit-limit"])
+        if "x-rate-limit-remaining" in headers:
+            self.remaining = int(headers["x-rate-limit-remaining"])
+        if "x-rate-limit-reset" in headers:
+            # リセット時刻はUNIX時間で返される
+            self.reset_at = time.monotonic() + max(0, int(headers["x-rate-limit-reset"]) - time.time())
+
+def _twitter_client():
+    """
+    Twitter API用のHTTPクライアントを作成する
+    
+    1回の分析の間は同じクライアントを共有し、HTTP/2の1つの接続上で全キーワードの検索を多重化する
+    （TLSハンドシェイクは最初の1回だけになる）
+    """
+    return httpx.AsyncClient(
+        http2=True,
+        timeout=10,
+        headers={"User-Agent": "niche-finder/1.0"},
+        limits=httpx.Limits(max_connections=MAX_CONCURRENT_REQUESTS, max_keepalive_connections=MAX_CONCURRENT_REQUESTS)
+    )
 
 def analyze_twitter_engagement(keywords, twitter_bearer_token=None):
     """
@@ -16,38 +121,68 @@ def analyze_twitter_engagement(keywords, twitter_bearer_token=None):
     Returns:
     dict: キーワードごとのエンゲージメント分析結果
     """
-    results = {}
+    # Bearer Tokenがない場合はモックデータを使用（通信が不要なので同期処理で十分）
+    if not twitter_bearer_token:
+        return mock_twitter_data_batch(keywords)
     
-    for keyword in keywords:
-        try:
-            if twitter_bearer_token:
-                data = get_twitter_data(keyword, twitter_bearer_token)
-                results[keyword] = {
-                    "総ツイート数": data.get("総ツイート数", 0),
-                    "平均エンゲージメント率": data.get("平均エンゲージメント率", 0),
-                    "感情傾向": data.get("感情傾向", "中立"),
-                    "データソース": "Twitter API"
-                }
-            else:
-                results[keyword] = mock_twitter_data(keyword)
-            
-            # APIレート制限を考慮
-            time.sleep(1)
-            
-        except Exception as e:
-            print(f"Twitter分析エラー ({keyword}): {e}")
+    async def run():
+        async with _twitter_client() as client:
+            return await analyze_twitter_engagement_async(keywords, twitter_bearer_token, client, TwitterRateLimiter())
+    
+    return asyncio.run(run())
+
+async def analyze_twitter_engagement_async(keywords, twitter_bearer_token, client, limiter):
+    """
+    analyze_twitter_engagementの非同期版。全キーワードの検索リクエストを並行して実行する
+    
+    Parameters:
+    keywords (list): 分析するキーワードのリスト
+    twitter_bearer_token (str): Twitter API Bearer Token
+    client (httpx.AsyncClient): 共有するHTTPクライアント
+    limiter (TwitterRateLimiter): 共有するレート制限
+    
+    Returns:
+    dict: キーワードごとのエンゲージメント分析結果
+    """
+    tasks = [get_twitter_data(keyword, twitter_bearer_token, client, limiter) for keyword in keywords]
+    responses = await asyncio.gather(*tasks, return_exceptions=True)
+    
+    results = {}
+    for keyword, data in zip(keywords, responses):
+        if isinstance(data, Exception):
+            print(f"Twitter分析エラー ({keyword}): {data}")
             results[keyword] = mock_twitter_data(keyword)
+            continue
+        
+        results[keyword] = {
+            "総ツイート数": data.get("総ツイート数", 0),
+            "平均エンゲージメント率": data.get("平均エンゲージメント率", 0),
+            "感情傾向": data.get("感情傾向", "中立"),
+            "データソース": "Twitter API"
+        }
     
     return results
 
-def get_twitter_data(keyword, bearer_token):
+async def get_twitter_data(keyword, bearer_token, client, limiter):
     """
     Twitter APIからキーワードに関連するツイートデータを取得
-    （注: 実際の実装ではTwitterの公式APIドキュメントに従って実装する必要があります）
     
     2023年以降のX/Twitter APIはv2を使用します
+    
+    Parameters:
+    keyword (str): 検索するキーワード
+    bearer_token (str): Twitter API Bearer Token
+    client (httpx.AsyncClient): HTTPクライアント
+    limiter (TwitterRateLimiter): レート制限
+    
+    Returns:
+    dict: ツイート数・エンゲージメント率・感情傾向
     """
-    # 実際のTwitter API v2実装例
+    # 同じキーワードの検索結果は24時間キャッシュし、レート制限の枠を消費しないようにする
+    cached = cache.get(("twitter", keyword))
+    if cached is not None:
+        return cached
+    
     headers = {
         "Authorization": f"Bearer {bearer_token}"
     }
@@ -60,46 +195,165 @@ def get_twitter_data(keyword, bearer_token):
         "tweet.fields": "public_metrics,created_at"
     }
     
-    # Twitter API v2エンドポイント
-    # url = "https://api.twitter.com/2/tweets/search/recent"
-    # response = requests.get(url, headers=headers, params=params)
+    # エンゲージメント率は直近のツイート（最大100件）から、ツイート数は件数APIの直近7日間の合計から求める
+    # （検索結果の件数は1ページ分の最大100件にしかならないため）
+    search_response, counts_response = await asyncio.gather(
+        _get_with_retry(client, "https://api.twitter.com/2/tweets/search/recent", headers, params, limiter),
+        _get_with_retry(
+            client, "https://api.twitter.com/2/tweets/counts/recent", headers,
+            {"query": query, "granularity": "day"},
+            limiter.for_endpoint("counts/recent", TWEET_COUNTS_RATE_LIMIT)
+        ),
+        return_exceptions=True
+    )
+    
+    if isinstance(search_response, Exception):
+        raise search_response
+    
+    # 件数APIが使えない場合（アクセスレベルによる403など）は、検索結果の件数で代用する
+    counts_payload = None
+    if isinstance(counts_response, Exception):
+        print(f"ツイート件数の取得エラー ({keyword})（検索結果の件数で代用します）: {counts_response}")
+    else:
+        counts_payload = orjson.loads(counts_response.content)
+    
+    data = _parse_twitter_response(orjson.loads(search_response.content), counts_payload)
+    cache.set(("twitter", keyword), data, expire=TWITTER_TTL)
+    return data
+
+async def _get_with_retry(client, url, headers, params, limiter):
+    """
+    レート制限を守りながらGETリクエストを送信し、一時的なエラーの場合は再試行する
+    
+    Parameters:
+    client (httpx.AsyncClient): HTTPクライアント
+    url (str): リクエスト先のURL
+    headers (dict): リクエストヘッダー
+    params (dict): クエリパラメータ
+    limiter (TwitterRateLimiter): エンドポイントのレート制限
+    
+    Returns:
+    httpx.Response: 成功したレスポンス
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        await limiter.acquire()
+        try:
+            response = await client.get(url, headers=headers, params=params)
+        except httpx.RequestError:
+            # 接続エラー・タイムアウトは指数バックオフで再試行する
+            if attempt == MAX_RETRIES:
+                raise
+            await asyncio.sleep(_retry_wait(attempt))
+            continue
+        limiter.update_from_headers(response)
+        
+        if response.status_code not in RETRY_STATUS_CODES or attempt == MAX_RETRIES:
+            break
+        
+        # Retry-Afterの秒数（なければ指数バックオフ）だけ待って再試行する
+        wait = _retry_after_seconds(response.headers.get("retry-after"))
+        await asyncio.sleep(wait if wait is not None else _retry_wait(attempt))
+    
+    response.raise_for_status()
+    return response
+
+def _retry_wait(attempt):
+    """再試行までの待機時間（指数バックオフ＋ジッター）"""
+    return random.uniform(0, min(MAX_RETRY_WAIT, 2 ** attempt))
+
+def _retry_after_seconds(value):
+    """
+    Retry-Afterヘッダーを待機秒数に変換する
+    
+    Parameters:
+    value (str): ヘッダーの値（秒数またはHTTP日付）
+    
+    Returns:
+    float: 待機秒数（MAX_RETRY_WAITで上限を設ける）。解釈できない場合はNone
+    """
+    if not value:
+        return None
+    
+    try:
+        seconds = float(value)
+        if math.isnan(seconds):
+            return None
+    except ValueError:
+        try:
+            retry_at = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=datetime.timezone.utc)
+        seconds = (retry_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
+    
+    return min(max(seconds, 0), MAX_RETRY_WAIT)
+
+def _parse_twitter_response(payload, counts_payload=None):
+    """
+    Twitter API v2の検索結果と件数APIの結果からツイート数とエンゲージメント率を集計する
     
-    # ここでレスポンスをパースしてエンゲージメントを計算する
+    件数APIの結果がない場合は、検索結果の件数（最大100件）をツイート数とする
+    """
+    tweets = payload.get("data", [])
+    if counts_payload is not None:
+        tweet_count = counts_payload.get("meta", {}).get(
+            "total_tweet_count",
+            sum(count.get("tweet_count", 0) for count in counts_payload.get("data", []))
+        )
+    else:
+        tweet_count = payload.get("meta", {}).get("result_count", len(tweets))
+    
+    # エンゲージメント率の計算（いいね、リツイート、返信の合計÷ツイート数）
+    interactions = 0
+    for tweet in tweets:
+        metrics = tweet.get("public_metrics", {})
+        interactions += metrics.get("like_count", 0) + metrics.get("retweet_count", 0) + metrics.get("reply_count", 0)
+    engagement_rate = interactions / len(tweets) if tweets else 0
     
-    # モックデータを返す（実際の実装では削除）
-    return mock_twitter_data(keyword)
+    return {
+        "総ツイート数": tweet_count,
+        "平均エンゲージメント率": round(engagement_rate, 2),
+        "感情傾向": "中立"  # 感情分析は未実装のため中立とする
+    }
 
 def mock_twitter_data(keyword):
     """モックTwitterデータ生成（APIが利用できない場合のテスト用）"""
-    import random
-    import hashlib
+    return mock_twitter_data_batch([keyword])[keyword]
+
+def mock_twitter_data_batch(keywords):
+    """複数キーワードのモックTwitterデータをまとめて生成（APIが利用できない場合のテスト用）"""
+    if not keywords:
+        return {}
     
-    # キーワードからハッシュ値を生成し、それを整数に変換して一貫性のあるランダム値を生成
-    hash_obj = hashlib.md5(keyword.encode())
-    hash_int = int(hash_obj.hexdigest(), 16)
-    random.seed(hash_int)
+    # キーワードのハッシュ値を0以上1未満の値に変換し、キーワードごとに一貫性のあるランダム値とする
+    # （キーワードごとに3つの値: ツイート数用、エンゲージメント率用、感情傾向用）
+    digests = b"".join(hashlib.blake2b(keyword.encode("utf-8"), digest_size=24).digest() for keyword in keywords)
+    random_values = np.frombuffer(digests, dtype="<u8").reshape(-1, 3) / 2.0**64
     
-    # キーワードの特性に基づいてツイート数を調整
-    base_tweets = random.randint(50, 5000)
+    # キーワードの特性に基づいてツイート数を調整（50〜5000件）
+    base_tweets = 50 + (random_values[:, 0] * 4951).astype(np.int64)
     
     # 一般的な話題はツイート数が多いと仮定
-    common_topics = ["食べ物", "旅行", "アニメ", "ゲーム", "健康", "スポーツ"]
-    topic_factor = any(topic in keyword for topic in common_topics)
-    tweet_count = base_tweets * (3 if topic_factor else 1)
+    topic_factor = np.array([_COMMON_TOPICS_PATTERN.search(keyword) is not None for keyword in keywords])
+    tweet_counts = base_tweets * np.where(topic_factor, 3, 1)
     
     # エンゲージメント率の計算（いいね、リツイート、返信の合計÷ツイート数）
-    engagement_rate = random.uniform(0.5, 10.0)
+    engagement_rates = 0.5 + random_values[:, 1] * 9.5
     
-    # 感情傾向
-    sentiment_options = ["ポジティブ", "やや肯定的", "中立", "やや否定的", "ネガティブ"]
-    sentiment_weights = [0.2, 0.3, 0.3, 0.15, 0.05]  # 多くのツイートは中立か肯定的
-    sentiment = random.choices(sentiment_options, weights=sentiment_weights, k=1)[0]
+    # 感情傾向（出現確率の累積値から選択）
+    cumulative_weights = np.cumsum(SENTIMENT_WEIGHTS)
+    sentiment_indices = np.searchsorted(cumulative_weights, random_values[:, 2] * cumulative_weights[-1], side="right")
+    sentiment_indices = np.minimum(sentiment_indices, len(SENTIMENT_OPTIONS) - 1)
     
     return {
-        "総ツイート数": tweet_count,
-        "平均エンゲージメント率": round(engagement_rate, 2),
-        "感情傾向": sentiment,
-        "データソース": "モックデータ"
+        keyword: {
+            "総ツイート数": int(tweet_count),
+            "平均エンゲージメント率": round(float(engagement_rate), 2),
+            "感情傾向": SENTIMENT_OPTIONS[sentiment_index],
+            "データソース": "モックデータ"
+        }
+        for keyword, tweet_count, engagement_rate, sentiment_index in zip(keywords, tweet_counts, engagement_rates, sentiment_indices)
     }
 
 def analyze_genre_social(genres, twitter_bearer_token=None):
@@ -107,95 +361,226 @@ def analyze_genre_social(genres, twitter_bearer_token=None):
     提案されたジャンルのSNS上での反応を分析する
     
     Parameters:
-    genres (list or dict or str): ジャンル情報
+    genres (list or dict or str or iterator): ジャンル情報
+        （genre_suggestion.stream_genresのようなイテレータを渡すと、ジャンルが届くたびに分析を開始する）
     twitter_bearer_token (str): Twitter API Bearer Token（オプション）
     
     Returns:
     dict: ジャンルごとのSNS分析結果
     """
-    all_results = {}
+    if isinstance(genres, collections.abc.Iterator) and twitter_bearer_token:
+        return asyncio.run(_analyze_genre_social_stream(genres, twitter_bearer_token))
+    
+    try:
+        genres = _canonicalize_genres(genres)
+    except Exception as e:
+        print(f"ジャンルデータの変換エラー: {e}")
+        return {}
+    
+    return asyncio.run(_analyze_genre_social_async(genres, twitter_bearer_token))
+
+async def _analyze_genre_social_async(genres, twitter_bearer_token=None):
+    """
+    analyze_genre_socialの非同期版。全ジャンルのキーワードのTwitter/X分析を並行して実行する
+    
+    複数のジャンルで重複するキーワードは1回だけ分析し、各ジャンルの結果で共有する
+    """
+    # ジャンル内で重複するキーワードは1つにまとめる（平均が重複したキーワードに偏らないように）
+    # 同名のジャンルは結果がジャンル名ごとになるため、後のものを採用する
+    genre_keywords = list({genre["ジャンル名"]: list(dict.fromkeys(genre["関連するキーワード例"])) for genre in genres}.items())
+    unique_keywords = list(dict.fromkeys(keyword for _, keywords in genre_keywords for keyword in keywords))
+    
+    # Twitter/X分析を実行
+    if twitter_bearer_token:
+        limiter = TwitterRateLimiter()
+        async with _twitter_client() as client:
+            keyword_data = await analyze_twitter_engagement_async(unique_keywords, twitter_bearer_token, client, limiter)
+    else:
+        keyword_data = mock_twitter_data_batch(unique_keywords)
+    
+    return _score_genres(genre_keywords, keyword_data)
+
+async def _analyze_genre_social_stream(genres, twitter_bearer_token):
+    """
+    ジャンルのイテレータを別スレッドで読み進めながら、届いたジャンルのキーワードから順にTwitter/X分析を開始する
     
-    # genresがリストでなければ、変換を試みる
-    if not isinstance(genres, list):
+    ジャンルの生成（Claude APIのストリーミングなど）とTwitter/X分析が並行して進むため、
+    全体の所要時間は両者の合計ではなく、おおよそ長い方の時間になる
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    end = object()
+    
+    def produce():
         try:
-            # 文字列の場合、JSONとしてパースを試みる
-            if isinstance(genres, str):
-                print("文字列をJSONに変換しています...")
-                genres = json.loads(genres)
-            
-            # 辞書の場合、特定のキーにジャンルリストがあるか確認
-            if isinstance(genres, dict):
-                for key in ["genres", "ジャンル", "results", "data"]:
-                    if key in genres and isinstance(genres[key], list):
-                        genres = genres[key]
-                        break
-                # キーが見つからなければ、単一のジャンル情報として扱う
-                if isinstance(genres, dict):
-                    genres = [genres]
+            for genre in genres:
+                loop.call_soon_threadsafe(queue.put_nowait, genre)
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, end)
+    
+    producer = asyncio.create_task(asyncio.to_thread(produce))
+    limiter = TwitterRateLimiter()
+    genre_keywords = []
+    keyword_tasks = {}
+    
+    async with _twitter_client() as client:
+        async def analyze_keyword(keyword):
+            return (await analyze_twitter_engagement_async([keyword], twitter_bearer_token, client, limiter))[keyword]
+        
+        while (genre := await queue.get()) is not end:
+            for canonical in _canonicalize_genres([genre]):
+                # ジャンル内で重複するキーワードは1つにまとめる（平均が重複したキーワードに偏らないように）
+                keywords = list(dict.fromkeys(canonical["関連するキーワード例"]))
+                genre_keywords.append((canonical["ジャンル名"], keywords))
+                # 複数のジャンルで重複するキーワードは1回だけ分析する
+                for keyword in keywords:
+                    if keyword not in keyword_tasks:
+                        keyword_tasks[keyword] = asyncio.create_task(analyze_keyword(keyword))
+        
+        try:
+            await producer
         except Exception as e:
-            print(f"ジャンルデータの変換エラー: {e}")
-            return {}
+            print(f"ジャンル取得エラー（取得済みのジャンルのみ分析します）: {e}")
+        
+        keyword_data = dict(zip(keyword_tasks, await asyncio.gather(*keyword_tasks.values())))
     
-    # 変換後もジャンルリストが整数、浮動小数点、文字列の場合はエラー
-    if isinstance(genres, (int, float, str)):
-        print(f"ジャンルデータの形式が不正です: {type(genres)}")
-        print(f"データの内容: {genres}")
-        return {}
+    return _score_genres(genre_keywords, keyword_data)
+
+@functools.singledispatch
+def _canonicalize_genres(genres):
+    """
+    ジャンル情報をジャンル（辞書）のリストに正規化する
     
-    # ここでジャンル情報をループ処理
+    Parameters:
+    genres (list or dict or str or iterable): ジャンル情報
+    
+    Returns:
+    list: ジャンル名と関連するキーワード例を必ず持つ辞書のリスト
+    """
+    # タプルやイテレータ（トークンがない場合のstream_genresなど）はリストとして扱う
+    if isinstance(genres, collections.abc.Iterable):
+        return _canonicalize_genres(list(genres))
+    raise TypeError(f"ジャンルデータの形式が不正です: {type(genres)}")
+
+@_canonicalize_genres.register(str)
+def _(genres):
+    # 文字列の場合、JSONとしてパースする
+    print("文字列をJSONに変換しています...")
+    return _canonicalize_genres(orjson.loads(genres))
+
+@_canonicalize_genres.register(dict)
+def _(genres):
+    # 特定のキーにジャンルリストがあるか確認
+    for key in ["genres", "ジャンル", "results", "data"]:
+        if key in genres and isinstance(genres[key], list):
+            return _canonicalize_genres(genres[key])
+    # キーが見つからなければ、単一のジャンル情報として扱う
+    return _canonicalize_genres([genres])
+
+@_canonicalize_genres.register(list)
+def _(genres):
+    canonical = []
     for genre in genres:
-        # genreが辞書でなければスキップ
-        if not isinstance(genre, dict):
-            if isinstance(genre, str):
-                # 単純な文字列の場合、ジャンル名として扱う
-                genre_name = genre
-                keywords = [genre]  # キーワードとしても使用
-            else:
-                print(f"不正なジャンル形式をスキップ: {type(genre)}")
-                continue
+        if isinstance(genre, dict):
+            # ジャンル名またはキーワードのないジャンルは分析対象外
+            if genre.get("ジャンル名") and genre.get("関連するキーワード例"):
+                canonical.append(genre)
+        elif isinstance(genre, str):
+            # 単純な文字列の場合、ジャンル名として扱い、キーワードとしても使用
+            canonical.append({"ジャンル名": genre, "関連するキーワード例": [genre]})
         else:
-            # 通常の辞書形式処理
-            genre_name = genre.get("ジャンル名", "")
-            keywords = genre.get("関連するキーワード例", [])
-        
-        if not genre_name:
-            continue
-            
-        if not keywords:
-            continue
-            
-        # Twitter/X分析を実行
-        twitter_data = analyze_twitter_engagement(keywords, twitter_bearer_token)
-        
-        # 結果をまとめる
-        genre_result = {
+            print(f"不正なジャンル形式をスキップ: {type(genre)}")
+    return canonical
+
+def _score_genres(genre_keywords, keyword_data):
+    """
+    キーワードごとの分析結果からジャンルごとのSNSスコアを計算する
+    
+    Parameters:
+    genre_keywords (list): (ジャンル名, キーワードのリスト)のリスト
+    keyword_data (dict): キーワードごとのTwitter/X分析結果
+    
+    Returns:
+    dict: ジャンルごとのSNS分析結果
+    """
+    if not genre_keywords:
+        return {}
+    
+    # 結果はジャンル名ごとにまとめるため、同名のジャンルは後のものを採用する
+    # （集計時に同名のジャンルのキーワードが混ざらないように）
+    genre_keywords = list(dict(genre_keywords).items())
+    
+    # ジャンルごとの平均（ツイート数、エンゲージメント率、感情スコア）
+    try:
+        averages = _grouped_averages(genre_keywords, keyword_data)
+    except ImportError:
+        # pandasがない環境では、ジャンルごとの平均をPythonのループで集計する
+        averages = {genre_name: _fold_averages(keywords, keyword_data) for genre_name, keywords in genre_keywords}
+    
+    # 全ジャンルのスコアを配列でまとめて計算
+    average_values = np.array(list(averages.values()), dtype=np.float64).reshape(-1, 3)
+    sns_scores = dict(zip(averages, _sns_scores(*average_values.T).tolist()))
+    
+    all_results = {}
+    for genre_name, keywords in genre_keywords:
+        all_results[genre_name] = {
             "ジャンル名": genre_name,
-            "SNS分析": twitter_data
-        }
-        
-        # ジャンル全体のSNSスコア計算
-        avg_tweet_count = sum([data.get("総ツイート数", 0) for data in twitter_data.values()]) / len(twitter_data) if twitter_data else 0
-        avg_engagement = sum([data.get("平均エンゲージメント率", 0) for data in twitter_data.values()]) / len(twitter_data) if twitter_data else 0
-        
-        # 感情傾向をスコア化（ポジティブ: 1.0, やや肯定的: 0.5, 中立: 0, やや否定的: -0.5, ネガティブ: -1.0）
-        sentiment_map = {
-            "ポジティブ": 1.0,
-            "やや肯定的": 0.5,
-            "中立": 0.0,
-            "やや否定的": -0.5,
-            "ネガティブ": -1.0
+            "SNS分析": {keyword: keyword_data[keyword] for keyword in keywords},
+            "SNSスコア": sns_scores[genre_name]
         }
-        
-        avg_sentiment = sum([sentiment_map.get(data.get("感情傾向", "中立"), 0) for data in twitter_data.values()]) / len(twitter_data) if twitter_data else 0
-        
-        # 正規化（0-100）したスコア
-        tweet_count_score = min(100, avg_tweet_count / 50)  # 5000ツイートで100点
-        engagement_score = min(100, avg_engagement * 10)    # エンゲージメント率10%で100点
-        sentiment_score = (avg_sentiment + 1) * 50          # -1から1の範囲を0-100に変換
-        
-        # 総合SNSスコア（ツイート数、エンゲージメント率、感情傾向の加重平均）
-        genre_result["SNSスコア"] = (tweet_count_score * 0.3) + (engagement_score * 0.5) + (sentiment_score * 0.2)
-        
-        all_results[genre_name] = genre_result
     
-    return all_results
\ No newline at end of file
+    return all_results
+
+def _sns_scores(avg_tweet_counts, avg_engagements, avg_sentiments):
+    """
+    ジャンルごとの平均値の配列から、総合SNSスコアの配列をまとめて計算する
+    
+    Parameters:
+    avg_tweet_counts (numpy.ndarray): 平均ツイート数
+    avg_engagements (numpy.ndarray): 平均エンゲージメント率
+    avg_sentiments (numpy.ndarray): 平均感情スコア（-1から1）
+    
+    Returns:
+    numpy.ndarray: 総合SNSスコア（0-100）
+    """
+    # 正規化（0-100）したスコア
+    tweet_count_score = np.minimum(100, avg_tweet_counts / 50)  # 5000ツイートで100点
+    engagement_score = np.minimum(100, avg_engagements * 10)    # エンゲージメント率10%で100点
+    sentiment_score = (avg_sentiments + 1) * 50                 # -1から1の範囲を0-100に変換
+    
+    # 総合SNSスコア（ツイート数、エンゲージメント率、感情傾向の加重平均）
+    return (tweet_count_score * 0.3) + (engagement_score * 0.5) + (sentiment_score * 0.2)
+
+def _grouped_averages(genre_keywords, keyword_data):
+    """全ジャンルのキーワードを1つのDataFrameにまとめ、ジャンルごとの平均をgroupbyで一度に集計する"""
+    # pandasは読み込みに時間がかかるため、集計が必要になった時点で読み込む
+    import pandas as pd
+    
+    rows = pd.DataFrame(
+        [(genre_name, keyword) for genre_name, keywords in genre_keywords for keyword in keywords],
+        columns=["ジャンル名", "キーワード"]
+    )
+    metrics = pd.DataFrame.from_dict(keyword_data, orient="index")
+    metrics["感情スコア"] = metrics["感情傾向"].map(SENTIMENT_SCORES).fillna(0)
+    
+    averages = (
+        rows.join(metrics, on="キーワード")
+        .groupby("ジャンル名", sort=False)[["総ツイート数", "平均エンゲージメント率", "感情スコア"]]
+        .mean()
+        .fillna(0)
+    )
+    return dict(zip(averages.index, averages.itertuples(index=False, name=None)))
+
+def _fold_averages(keywords, keyword_data):
+    """1つのジャンルのキーワードを1回だけ走査し、ツイート数・エンゲージメント率・感情スコアの平均を求める"""
+    total_tweets = total_engagement = total_sentiment = count = 0
+    for keyword in keywords:
+        data = keyword_data[keyword]
+        total_tweets += data.get("総ツイート数", 0)
+        total_engagement += data.get("平均エンゲージメント率", 0)
+        total_sentiment += SENTIMENT_SCORES.get(data.get("感情傾向", "中立"), 0)
+        count += 1
+    
+    if not count:
+        return 0, 0, 0
+    return total_tweets / count, total_engagement / count, total_sentiment / count